@@ -12,36 +12,89 @@ import numpy as np
 import pandas as pd
 import os
 import plotly.express as px
+import plotly.graph_objects as go
 from datetime import date
 
 # CSV files used throughout 
 b = 'budget.csv' # you will need to make sure these are in your directory! 
 e = 'expenses.csv' # you will need to make sure these are in your directory! 
 
+# Expense categories that count toward the fixed budget
+fixed_categories = ['Rent', 'Subscriptions', 'Groceries', 'Utilities', 'Gas', 'Pet Expenses', 'Gym Membership']
+
+# Chart color palette, looked up once instead of on every chart call
+GREENS = tuple(px.colors.sequential.Greens)
+
+# Column types for each CSV so read_csv can parse straight into them instead of inferring
+# (Month is read as text here and converted to monthly periods in _load_csv)
+_CSV_DTYPES = {
+    b: {"Month": "string", "Paycheck": "float64", "saving1": "float64", "saving2": "float64", "saving3": "float64",
+        "Total_Saved": "float64", "Fixed_Expenses": "float64", "Misc_Budget": "float64"},
+    e: {"Month": "string", "Amount": "float64", "Category": "category", "Planned_Unplanned": "category", "Description": "string"},
+}
+
+# Empty frames returned when a CSV is missing, built once instead of on every call
+_EMPTY_BUDGET = pd.DataFrame(columns=["Month", "Paycheck", "saving1", "saving2", "saving3", "Total_Saved", "Fixed_Expenses", "Misc_Budget"]).astype({**_CSV_DTYPES[b], "Month": "period[M]"})
+_EMPTY_EXPENSES = pd.DataFrame(columns=["Month", "Amount", "Category", "Planned_Unplanned", "Description"]).astype({**_CSV_DTYPES[e], "Month": "period[M]"})
+
 # functions used throughout app
+@st.cache_data
+def _load_csv(path, mtime):
+    # mtime is only part of the cache key so the file is re-read after it changes
+    # Category and Planned_Unplanned are repeated labels, so they are read as categoricals
+    df = pd.read_csv(path, dtype=_CSV_DTYPES.get(path), engine='c')
+    if 'Month' in df.columns:
+        # Months are written as YYYY-MM (older rows used MM/YYYY); store them as monthly periods so
+        # grouping and sorting work on integer ordinals, and sort here once per file change
+        months = pd.to_datetime(df['Month'], format='%Y-%m', errors='coerce')
+        months = months.fillna(pd.to_datetime(df['Month'], format='%m/%Y', errors='coerce'))
+        df['Month'] = months.dt.to_period('M')
+        df = df.sort_values(by='Month', kind='stable', ignore_index=True)
+    return df
+
 def create_dataframe(csv): 
-    df = pd.read_csv(csv)
+    df = _load_csv(csv, os.path.getmtime(csv))
     return df
 
-def time_plot(data, cat):
-    group = data.groupby(['Month', 'Category'])['Amount'].sum().reset_index()
-    filtered = group[group['Category'] == cat]
-    filtered = filtered.sort_values(by = 'Month')
-    fig = px.line(filtered, x='Month', y='Amount', title=f"Change in {cat} Over Time", color_discrete_sequence = ['black'])
-    st.plotly_chart(fig)
+def pie_colors(n): 
+    # Cycle through the palette like px.pie does, so every slice stays green past the ninth category
+    return [GREENS[i % len(GREENS)] for i in range(n)]
+
+# Figure builders are cached on their inputs (streamlit hashes the DataFrame contents),
+# so reruns triggered by unrelated widgets reuse the existing figure
+@st.cache_data
+def _build_time_fig(grouped, cat):
+    filtered = grouped[grouped['Category'] == cat]
+    fig = go.Figure(go.Scatter(mode='lines', x=filtered['Month'].dt.to_timestamp().to_numpy(), y=filtered['Amount'].to_numpy(), line_color='black'))
+    fig.update_layout(title=f"Change in {cat} Over Time", xaxis_title='Month', yaxis_title='Amount')
+    return fig
+
+# Not cached: pie_chart keeps this figure in session state, so it is only built once per session
+def _build_pie_fig(data, group):
+    fig = go.Figure(go.Pie(values=data[group].to_numpy(), labels=data['Category'].to_numpy(), marker_colors=pie_colors(len(data))))
+    return fig
+
+@st.cache_data
+def _build_bar_fig(data):
+    # Column-wise sum gives one total per account type, indexed by the column name
+    totals = data.filter(items=['saving1', 'saving2', 'saving3', 'Total_Saved']).sum(axis=0)
+    fig = go.Figure(go.Bar(x=totals.index.to_numpy(), y=totals.to_numpy(), marker_color=GREENS[:len(totals)]))
+    fig.update_layout(xaxis_title='Account Type', yaxis_title='Amount')
+    return fig
+
+def time_plot(grouped, cat):
+    st.plotly_chart(_build_time_fig(grouped, cat))
 
 def pie_chart(data, group): 
-    fig = px.pie(data, values=group, names='Category', color_discrete_sequence=px.colors.sequential.Greens)
-    st.plotly_chart(fig)
-
-def bar_chart(data_csv): 
-    data = pd.read_csv(data_csv)
-    df_melted = pd.melt(data, id_vars=['Month'], var_name='Account Type', value_name='Amount')
-    df_melted = df_melted.sort_values(by='Month')
-    df_melted = df_melted[df_melted['Account Type'].isin(['saving1', 'saving2', 'saving3', 'Total Saved'])]
-    df_melted_g = df_melted.groupby('Account Type')['Amount'].sum().reset_index()
-    fig = px.bar(df_melted_g, x='Account Type', y='Amount', color = 'Account Type', color_discrete_sequence=px.colors.sequential.Greens)
-    st.plotly_chart(fig)
+    # Build the pie once per session and only swap its data when the selected month changes
+    if 'pie_fig' not in st.session_state:
+        st.session_state['pie_fig'] = _build_pie_fig(data, group)
+    else:
+        st.session_state['pie_fig'].update_traces(values=data[group].to_numpy(), labels=data['Category'].to_numpy(), marker_colors=pie_colors(len(data)))
+    st.plotly_chart(st.session_state['pie_fig'], key='pie')
+
+def bar_chart(data): 
+    st.plotly_chart(_build_bar_fig(data))
 
 def check_budget_exists(budget_csv = b): 
         # Load existing data if the file exists
@@ -50,9 +103,9 @@ def check_budget_exists(budget_csv = b):
             budget_df = create_dataframe(budget_csv)
         except Exception as error:
             st.error(f"Error reading CSV: {error}")
-            budget_df = pd.DataFrame(columns=["Month", "Paycheck", "saving1", "saving2", "STS", "Total_Saved", "Fixed_Expenses", "Misc_Budget"])
+            budget_df = _EMPTY_BUDGET.copy()
     else:
-        budget_df = pd.DataFrame(columns=["Month", "Paycheck", "saving1", "saving2", "STS", "Total_Saved", "Fixed_Expenses", "Misc_Budget"])
+        budget_df = _EMPTY_BUDGET.copy()
 
     return budget_df
 
@@ -62,12 +115,39 @@ def check_expense_exists(expense_csv = e):
             expense_df = create_dataframe(expense_csv)
         except Exception as error:
             st.error(f"Error reading CSV: {error}")
-            expense_df = pd.DataFrame(columns=["Month", "Amount", "Category", "Planned_Unplanned", "Description"])
+            expense_df = _EMPTY_EXPENSES.copy()
     else:
-        expense_df = pd.DataFrame(columns=["Month", "Amount", "Category", "Planned_Unplanned", "Description"])
+        expense_df = _EMPTY_EXPENSES.copy()
 
     return expense_df
 
+def append_csv_row(new_data, csv): 
+    # Write the header for a missing or empty file; otherwise make sure the file ends with a newline
+    # so the new row doesn't get joined onto a hand-made header line
+    write_header = not os.path.exists(csv) or os.path.getsize(csv) == 0
+    if not write_header:
+        with open(csv, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            ends_with_newline = f.read(1) == b'\n'
+        if not ends_with_newline:
+            with open(csv, 'a') as f:
+                f.write('\n')
+    new_data.to_csv(csv, mode='a', header=write_header, index=False)
+
+def load_session_data(): 
+    # Keep the loaded frames in session state so reruns skip both parsing and the cache lookup
+    if 'budget_df' not in st.session_state:
+        st.session_state['budget_df'] = check_budget_exists()
+    if 'expense_df' not in st.session_state:
+        st.session_state['expense_df'] = check_expense_exists()
+
+def warn_unparsed_months(): 
+    # Months in neither YYYY-MM nor MM/YYYY load as NaT and drop out of every groupby, so say so
+    for name, df in [(b, st.session_state['budget_df']), (e, st.session_state['expense_df'])]:
+        unparsed = df['Month'].isna().sum()
+        if unparsed:
+            st.warning(f"{unparsed} row(s) in {name} have a Month that isn't YYYY-MM or MM/YYYY and are left out of the summaries.")
+
 # SETTING UP STREAMLIT APP
 st.set_page_config(layout="wide", initial_sidebar_state="expanded", page_icon="💵", page_title="Personal Finance Hub")
 
@@ -78,64 +158,64 @@ page = st.sidebar.selectbox(
     index=0
 )
 
+load_session_data()
+warn_unparsed_months()
+
 # PAGE: Finances at a Glance
 if page == "Finances at a Glance": 
     st.title("Finances at a Glance")
 
-    try: 
-        finances_df = create_dataframe(e)
-        finances_df = finances_df.sort_values(by = 'Month') # Select only numeric columns
-        grouped_finances = finances_df.groupby(['Month', 'Category'])['Amount'].sum().reset_index() # Compute percentage change
-        grouped_finances['Amount_PctChange'] = grouped_finances.groupby(['Month', 'Category'])['Amount'].pct_change().fillna(0)
-
-        st.header("Change in Expense Category by Month")
-        c1, c2, c3 = st.columns(3)
+    finances_df = st.session_state['expense_df']
+    grouped_finances = finances_df.groupby(['Month', 'Category'], sort=False, observed=True)['Amount'].sum().reset_index()
+    # Average month-over-month percent change for every category in one pass; a change from a $0 month
+    # is infinite, so it is dropped rather than shown as inf%
+    monthly_totals = grouped_finances.pivot(index='Month', columns='Category', values='Amount').sort_index()
+    mean_pct_change = monthly_totals.pct_change(fill_method=None).replace([np.inf, -np.inf], np.nan).mean()
+
+    st.header("Change in Expense Category by Month")
+    c1, c2, c3 = st.columns(3)
+
+    with c1:
+        time_plot(grouped_finances,'Rent')
+        mean_rent = mean_pct_change.get('Rent')
+        if pd.notna(mean_rent): 
+            st.metric("Average Percent Change in Rent Over Time", f"{round(mean_rent * 100, 2)}%")
+    with c2:
+        time_plot(grouped_finances,'Utilities')
+        mean_utilities = mean_pct_change.get('Utilities')
+        if pd.notna(mean_utilities):    
+            st.metric("Average Percent Change in Utilities Over Time", f"{round(mean_utilities * 100, 2)}%")
+    with c3:
+        time_plot(grouped_finances,'Groceries')
+        mean_groceries = mean_pct_change.get('Groceries')
+        if pd.notna(mean_groceries): 
+            st.metric("Average Percent Change in Groceries Over Time", f"{round(mean_groceries * 100, 2)}%")
     
-        with c1:
-            time_plot(finances_df,'Rent')
-            mean_rent = grouped_finances[grouped_finances['Category'] == 'Rent']['Amount_PctChange'].mean()
-            if not mean_rent: 
-                st.metric("Average Percent Change in Rent Over Time", f"{round(mean_rent, 2) * 100}%")
-        with c2:
-            time_plot(finances_df,'Utilities')
-            mean_utilities = grouped_finances[grouped_finances['Category'] == 'Rent']['Amount_PctChange'].mean()
-            if not mean_utilities:    
-                st.metric("Average Percent Change in Utilities Over Time", f"{round(mean_utilities, 2) * 100}%")
-        with c3:
-            time_plot(finances_df,'Groceries')
-            mean_groceries = grouped_finances[grouped_finances['Category'] == 'Rent']['Amount_PctChange'].mean()
-            if not mean_groceries: 
-                st.metric("Average Percent Change in Rent Over Time", f"{round(mean_groceries, 2) * 100}%")
-        
-        st.divider()
-
-        st.header("Proportion of Total Expenses by Month and Category")
-        month_select = st.selectbox("Select Month", grouped_finances['Month'].unique())
-        
-        try: 
-            pie_chart(grouped_finances[grouped_finances['Month'] == month_select], 'Amount')
-            st.metric("Sum of Expenses by Month ($)", round(grouped_finances[grouped_finances['Month'] == month_select]['Amount'].sum(), 2))
-        except: 
-            st.write("There are no logged expenses.")
+    st.divider()
 
-        st.divider()
-        st.header("Savings by Account Type")
+    st.header("Proportion of Total Expenses by Month and Category")
+    month_select = st.selectbox("Select Month", grouped_finances['Month'].unique())
+    
+    month_finances = grouped_finances[grouped_finances['Month'] == month_select]
+    if month_finances.empty: 
+        st.write("There are no logged expenses.")
+    else: 
+        pie_chart(month_finances, 'Amount')
+        st.metric("Sum of Expenses by Month ($)", round(month_finances['Amount'].sum(), 2))
 
-        try: 
-            bar_chart(b)
-        except: 
-            st.write('There are no logged savings.')
+    st.divider()
+    st.header("Savings by Account Type")
 
-    except FileNotFoundError:
-        st.error("Error: budget.csv not found. Please upload or create a budget file.")
-    except Exception as e:
-        st.error(f"Error: {e}")
+    if st.session_state['budget_df'].empty: 
+        st.write('There are no logged savings.')
+    else: 
+        bar_chart(st.session_state['budget_df'])
 
 # PAGE: Allocate my Paycheck
 if page == "Allocate my Paycheck": 
     st.header("Allocate my Paycheck")
 
-    budget_df = check_budget_exists()
+    budget_df = st.session_state['budget_df']
 
     with st.form("paycheck_form"): 
 
@@ -147,23 +227,20 @@ if page == "Allocate my Paycheck":
         # Date input and converting it to month/year format 
         curr_date = st.date_input("What's the date?", value=None, format="MM/DD/YYYY")
         if curr_date:
-            month = curr_date.strftime("%m/%Y")
+            month = curr_date.strftime("%Y-%m")
         
         paycheck = st.number_input("Input take-home paycheck amount...", min_value=0.0)
         
-        try:
-            expense_df = check_expense_exists()
-            rent_max = expense_df[expense_df['Category'] == 'Rent']['Amount'].max() if not expense_df[expense_df['Category'] == 'Rent'].empty else 0
-            subscriptions_max = expense_df[expense_df['Category'] == 'Subscriptions']['Amount'].max() if not expense_df[expense_df['Category'] == 'Subscriptions'].empty else 0
-            groceries_avg = expense_df[expense_df['Category'] == 'Groceries']['Amount'].mean() if not expense_df[expense_df['Category'] == 'Groceries'].empty else 0
-            utilities_max = expense_df[expense_df['Category'] == 'Utilities']['Amount'].max() if not expense_df[expense_df['Category'] == 'Utilities'].empty else 0
-            gas_max = expense_df[expense_df['Category'] == 'Gas']['Amount'].mean() if not expense_df[expense_df['Category'] == 'Gas'].empty else 0
-            pet_avg = expense_df[expense_df['Category'] == 'Pet Expenses']['Amount'].mean() if not expense_df[expense_df['Category'] == 'Pet Expenses'].empty else 0
-            gym_max = expense_df[expense_df['Category'] == 'Gym Membership']['Amount'].max() if not expense_df[expense_df['Category'] == 'Gym Membership'].empty else 0
-
-        except FileNotFoundError:
-            st.error("Expenses file not found.")
-            rent_max = subscriptions_max = groceries_avg = utilities_max = gas_max = pet_avg = 0
+        expense_df = st.session_state['expense_df']
+        stats = expense_df.groupby('Category', sort=False, observed=True)['Amount'].agg(['max', 'mean'])
+        stats = stats.reindex(fixed_categories).fillna(0)
+        rent_max = stats.loc['Rent', 'max']
+        subscriptions_max = stats.loc['Subscriptions', 'max']
+        groceries_avg = stats.loc['Groceries', 'mean']
+        utilities_max = stats.loc['Utilities', 'max']
+        gas_max = stats.loc['Gas', 'mean']
+        pet_avg = stats.loc['Pet Expenses', 'mean']
+        gym_max = stats.loc['Gym Membership', 'max']
 
         # Calculating the portion of paycheck going to each fund and adding them to total saved
         saving1_acct = paycheck * saving1
@@ -182,9 +259,10 @@ if page == "Allocate my Paycheck":
         # If the paycheck is submitted, append a new row to the budget dataframe
         if submitted:
             # Append new data
-            new_data = pd.DataFrame([[month, paycheck, saving1_acct, saving2_acct, sts_acct, total_saved, fixed_budget, misc_budget]], columns=budget_df.columns)
-            budget_df = pd.concat([budget_df, new_data], ignore_index=True)
-            budget_df.to_csv(b, index=False)
+            new_data = pd.DataFrame([[month, paycheck, saving1_acct, saving2_acct, saving3_acct, total_saved, fixed_budget, misc_budget]], columns=budget_df.columns)
+            append_csv_row(new_data, b)
+            _load_csv.clear()
+            st.session_state['budget_df'] = check_budget_exists()
             st.success("Your paycheck has been successfully allocated!")
             st.balloons()
 
@@ -220,13 +298,12 @@ if page == "Allocate my Paycheck":
 if page == "Log my Expenses": 
     st.title("Log my Expenses")
         
-    e_df = check_expense_exists()
-    b_df = check_budget_exists()
+    e_df = st.session_state['expense_df']
 
     with st.form("expense_form"): 
         st.subheader("Expense Form")
         curr_date = st.date_input("What's the date?", value = None, format = "MM/DD/YYYY")
-        if curr_date: month = curr_date.strftime("%m/%Y")
+        if curr_date: month = curr_date.strftime("%Y-%m")
         amount = st.number_input("How much did you spend?")
         category = st.selectbox(
             "What category does this fall into?",
@@ -243,67 +320,82 @@ if page == "Log my Expenses":
         expense_submit = st.form_submit_button("Log Expense")
 
         if expense_submit:
-            # Append new expense to the expense dataframe
+            # Append new expense to the end of the expense csv
             new_data = pd.DataFrame([[month, amount, category, scheduled, description]], columns=e_df.columns)
-            e_df = pd.concat([e_df, new_data], ignore_index=True)
-            e_df.to_csv(e, index=False)
+            append_csv_row(new_data, e)
+            _load_csv.clear()
+            st.session_state['expense_df'] = check_expense_exists()
             st.success("Your expense has been successfully logged!")
             st.balloons()
 
     # This is now getting into giving the current expense summary
     st.header('Expense Summary')
 
-    expense_summary = check_expense_exists()
-    budget_check = check_budget_exists()
+    expense_summary = st.session_state['expense_df']
+    budget_check = st.session_state['budget_df']
+    # A month with several paychecks has one budget row per paycheck, so its budget is their total
+    budget_by_month = budget_check.groupby('Month', sort=False)[['Misc_Budget', 'Fixed_Expenses']].sum()
+    misc_by_month = budget_by_month['Misc_Budget'].to_dict()
+    fixed_by_month = budget_by_month['Fixed_Expenses'].to_dict()
 
     select_month = st.selectbox("Select which month you want to see expenses for..." , options=expense_summary['Month'].unique())
 
-    try:
-        st.subheader('Miscellaneous Expenses')
-        month_misc_expenses = expense_summary.groupby(['Month', 'Category'])['Amount'].sum()
-        st.dataframe(month_misc_expenses[select_month], use_container_width=True)
-        total_misc_expenses = month_misc_expenses[select_month].sum()
+    # Month x Category totals, so each section below is a label lookup instead of another groupby
+    # (categories with nothing logged in a month are left as NaN, so a real $0 total is kept apart from them)
+    expense_pivot = expense_summary.pivot_table(index='Month', columns='Category', values='Amount', aggfunc='sum', observed=True)
+    # Split the pivot columns into fixed and miscellaneous categories by comparing category codes
+    fixed_codes = expense_pivot.columns.categories.get_indexer(fixed_categories)
+    is_fixed = np.isin(expense_pivot.columns.codes, fixed_codes[fixed_codes >= 0])
+
+    if select_month in expense_pivot.index:
+        month_expenses = expense_pivot.loc[select_month]
+    else:
+        month_expenses = pd.Series(np.nan, index=expense_pivot.columns)
+    month_misc_expenses = month_expenses[~is_fixed].dropna()
+    month_fixed_expenses = month_expenses[is_fixed].dropna()
+
+    st.subheader('Miscellaneous Expenses')
+
+    if month_misc_expenses.empty:
+        st.write("There are no miscellaneous expenses logged.")
+    else:
+        st.dataframe(month_misc_expenses, use_container_width=True)
+        total_misc_expenses = month_misc_expenses.sum()
         st.metric('Total Miscellaneous Expenses (Month)', f"${round(total_misc_expenses, 2):,.2f}")
         
-        misc = budget_check[budget_check['Month'] == select_month]['Misc_Budget'][0]
-        over_by_misc = total_misc_expenses - misc
-        if total_misc_expenses > misc: 
+        if select_month not in misc_by_month:
+            st.write("There is no miscellaneous spend budget logged for this month.")
+        elif total_misc_expenses > misc_by_month[select_month]: 
+            over_by_misc = total_misc_expenses - misc_by_month[select_month]
             st.warning(f"FYI you are over the miscellaneous spend budget by ${round(over_by_misc,2)}")
         else : 
             st.write("You are within the miscellaneous spend budget.")   
-    except: 
-        st.write("There are no miscellaneous expenses logged.")
         
     st.divider()
 
     st.subheader('Fixed Expenses')
 
-    fixed_categories = ['Rent', 'Subscriptions', 'Groceries', 'Utilities', 'Gas', 'Pet Expenses', 'Gym Membership']
-    month_fixed_expenses = expense_summary.groupby(['Month', 'Category'])['Amount'].sum()
-    month_fixed_expenses = month_fixed_expenses[month_fixed_expenses.index.get_level_values('Category').isin(fixed_categories)]
-
-    try:
-        total_fixed_expenses = month_fixed_expenses[select_month].sum()
-        st.dataframe(month_fixed_expenses[select_month], use_container_width=True)
+    if month_fixed_expenses.empty:
+        st.write('There are no fixed expenses logged.')
+    else:
+        total_fixed_expenses = month_fixed_expenses.sum()
+        st.dataframe(month_fixed_expenses, use_container_width=True)
         st.metric('Total Fixed Expenses (Month)', f"${round(total_fixed_expenses, 2):,.2f}")
 
-        fixed = budget_check[budget_check['Month'] == select_month]['Fixed_Expenses'].iloc[0]
-        over_by_fixed = total_fixed_expenses - fixed
-
-        if total_fixed_expenses > fixed:
+        if select_month not in fixed_by_month:
+            st.write("There is no fixed expenses budget logged for this month.")
+        elif total_fixed_expenses > fixed_by_month[select_month]:
+            over_by_fixed = total_fixed_expenses - fixed_by_month[select_month]
             st.warning(f"FYI you are over the fixed expenses budget by ${over_by_fixed:,.2f}")
         else:
             st.write("You are within the fixed expenses budget.")
 
-    except KeyError:
-        st.write('There are no fixed expenses logged.')
-
 if page == 'Historical Data': 
     st.title('Historical Data')
     st.header('Budget History')
-    b_history = create_dataframe(b).sort_values(by = 'Month')
+    b_history = st.session_state['budget_df']
     st.dataframe(b_history, use_container_width=True)
 
     st.header('Expense History')
-    e_history = create_dataframe(e).sort_values(by='Month')
+    e_history = st.session_state['expense_df']
     st.dataframe(e_history, use_container_width=True)